@@ -2,33 +2,37 @@
 
 from __future__ import annotations
 
+import io
 import sys
 import enum
 import token
 import argparse
 import tokenize
-import itertools
 from typing import (
+    cast,
+    Dict,
     List,
     Tuple,
-    Union,
-    TypeVar,
+    Callable,
     Iterable,
     Iterator,
+    Optional,
     Protocol,
+    Sequence,
     NamedTuple,
 )
 from tokenize import TokenInfo
 
-T = TypeVar('T')
-U = TypeVar('U')
-
-WHITESPACE_TOKENS = (
+WHITESPACE_TOKENS = frozenset((
     token.NEWLINE,
     token.INDENT,
     token.DEDENT,
     token.NL,
-)
+    token.ENDMARKER,
+    # Emitted by `tokenize.tokenize` (but not `generate_tokens`) when reading
+    # from bytes.
+    token.ENCODING,
+))
 
 
 class Visitor(Protocol):
@@ -60,22 +64,70 @@ class NodeKind(enum.Enum):
     @classmethod
     def from_token(cls, tok: TokenInfo) -> NodeKind:
         if tok.type == token.OP:
-            if tok.string == ',':
-                return cls.COMMA
+            return _NODE_KINDS[_OP_KIND.get(tok.string, _OTHER)]
 
-            if tok.string in '([{':
-                return cls.OPEN_PAREN
+        return cls.OTHER
 
-            if tok.string in ')]}':
-                return cls.CLOSE_PAREN
 
-        return cls.OTHER
+# Integer kinds for the parser's hot path: comparing plain ints avoids the
+# enum's attribute and equality machinery. `NodeKind` remains the public
+# vocabulary and is what nodes expose.
+_OTHER = 0
+_OPEN_PAREN = 1
+_CLOSE_PAREN = 2
+_COMMA = 3
+
+# Precomputed kinds for the operator strings we care about, avoiding per-token
+# string scans on the parser's hot path. This is also the converged form of a
+# memoisation cache for `from_token`: the interesting alphabet is tiny and
+# known up front, so there is nothing left to learn at runtime.
+_OP_KIND: Dict[str, int] = {
+    ',': _COMMA,
+    '(': _OPEN_PAREN,
+    '[': _OPEN_PAREN,
+    '{': _OPEN_PAREN,
+    ')': _CLOSE_PAREN,
+    ']': _CLOSE_PAREN,
+    '}': _CLOSE_PAREN,
+}
+
+# Interned operator strings. CPython caches single-character ASCII strings,
+# so for these an identity check is a reliable pointer comparison which skips
+# the character-wise equality path. Interning explicitly guarantees we hold
+# the cached objects.
+_COMMA_STR = sys.intern(',')
+_LPAREN = sys.intern('(')
+_LSQB = sys.intern('[')
+_LBRACE = sys.intern('{')
+_RPAREN = sys.intern(')')
+_RSQB = sys.intern(']')
+_RBRACE = sys.intern('}')
+
+# Mapping from integer kind back to the public enum, indexed by kind.
+_NODE_KINDS = (
+    NodeKind.OTHER,
+    NodeKind.OPEN_PAREN,
+    NodeKind.CLOSE_PAREN,
+    NodeKind.COMMA,
+)
 
 
 class Node:
+    __slots__ = ('children',)
+
+    # The class' name, cached so display code doesn't pay for the
+    # `type(node).__name__` attribute chain on every node.
+    NODE_TYPE_NAME = 'Node'
+
+    def __init_subclass__(cls) -> None:
+        super().__init_subclass__()
+        cls.NODE_TYPE_NAME = cls.__name__
+
     def __init__(self, children: List[Node]) -> None:
         self.children: List[Node] = children
 
+    # Note: visitor dispatch is a direct method call overridden per concrete
+    # class -- there is no name-based lookup to optimise here.
     def visit(self, visitor: Visitor) -> None:
         return visitor.visitNode(self)
 
@@ -99,13 +151,21 @@ class Node:
 
 
 class SingleTokenNode(Node):
-    def __init__(self, tok: TokenInfo) -> None:
+    __slots__ = ('token', 'kind', '_str')
+
+    def __init__(self, tok: TokenInfo, kind: Optional[NodeKind] = None) -> None:
         super().__init__([])
         self.token = tok
-        self.kind = NodeKind.from_token(tok)
+        # Callers which have already worked out the kind (such as `parse_ast`)
+        # can pass it in to avoid computing it twice.
+        self.kind = NodeKind.from_token(tok) if kind is None else kind
         if self.kind is NodeKind.OTHER:
             raise ValueError(f"Unexpected token kind {tok!r} for single token node")
 
+        # Nodes are immutable once built, so the display form can be computed
+        # up front rather than on every str() call during stringification.
+        self._str = f"<SingleTokenNode {tok.string!r}>"
+
     def visit(self, visitor: Visitor) -> None:
         return visitor.visitSingleTokenNode(self)
 
@@ -121,21 +181,31 @@ class SingleTokenNode(Node):
         return f"SingleTokenNode({self.token!r})"
 
     def __str__(self) -> str:
-        return f"<SingleTokenNode {self.token.string!r}>"
+        return self._str
+
+
+# Bound here so the predicates below don't pay the enum attribute lookup on
+# each call. Identity checks are valid since enum members are singletons, and
+# `type(...) is` suffices since SingleTokenNode has no subclasses.
+_COMMA_KIND = NodeKind.COMMA
+_CLOSE_PAREN_KIND = NodeKind.CLOSE_PAREN
 
 
 def is_comma(node: Node) -> bool:
-    return isinstance(node, SingleTokenNode) and node.kind == NodeKind.COMMA
+    return type(node) is SingleTokenNode and node.kind is _COMMA_KIND
 
 
 def is_close_paren(node: Node) -> bool:
-    return isinstance(node, SingleTokenNode) and node.kind == NodeKind.CLOSE_PAREN
+    return type(node) is SingleTokenNode and node.kind is _CLOSE_PAREN_KIND
 
 
 class MultiTokenNode(Node):
-    def __init__(self, tokens: List[TokenInfo]) -> None:
+    __slots__ = ('tokens', '_str')
+
+    def __init__(self, tokens: Sequence[TokenInfo]) -> None:
         super().__init__([])
         self.tokens = tokens
+        self._str = f"<MultiTokenNode {' '.join(x.string for x in tokens)!r}>"
 
     def visit(self, visitor: Visitor) -> None:
         return visitor.visitMultiTokenNode(self)
@@ -156,18 +226,51 @@ class MultiTokenNode(Node):
         return f"MultiTokenNode({self.tokens!r})"
 
     def __str__(self) -> str:
-        return f"<MultiTokenNode {' '.join(x.string for x in self.tokens)!r}>"
+        return self._str
+
+
+class _SpanNode(Node):
+    """
+    A lightweight stand-in for `MultiTokenNode` which records only the
+    endpoints of a run of tokens.
+
+    Validation only looks at positions, so the single-pass `process` path
+    uses this to avoid retaining (or even building) full token lists.
+    """
+
+    __slots__ = ('_first', '_last')
+
+    def __init__(self, first: TokenInfo, last: TokenInfo) -> None:
+        super().__init__([])
+        self._first = first
+        self._last = last
+
+    @property
+    def start_pos(self) -> Tuple[int, int]:
+        return self._first.start
+
+    @property
+    def end_line(self) -> int:
+        return self._last.end[0]
+
+    def __repr__(self) -> str:
+        return f"_SpanNode({self._first!r}, {self._last!r})"
+
+
+# The bracket pairings which may form a parens group.
+_VALID_PAIRS = frozenset((
+    ('(', ')'),
+    ('[', ']'),
+    ('{', '}'),
+))
 
 
 class ParensGroupNode(Node):
+    __slots__ = ('start', 'end', '_str')
+
     @staticmethod
     def validate_start_end(start: TokenInfo, end: TokenInfo) -> None:
-        expected_end = {
-            '(': ')',
-            '{': '}',
-            '[': ']',
-        }[start.string]
-        if end.string != expected_end:
+        if (start.string, end.string) not in _VALID_PAIRS:
             raise ValueError(
                 "Start and end must be the same kind of bracket "
                 f"(got {start.string!r} and {end.string!r}",
@@ -185,6 +288,9 @@ class ParensGroupNode(Node):
 
         self.validate_start_end(start.token, end.token)
 
+        contents = " ... " if children else ""
+        self._str = f"<ParensGroupNode {start.token.string}{contents}{end.token.string}>"
+
     def visit(self, visitor: Visitor) -> None:
         return visitor.visitParensGroupNode(self)
 
@@ -199,12 +305,18 @@ class ParensGroupNode(Node):
     def iter_comma_separated(self) -> Iterator[Node]:
         yield self.start
 
-        # Split the list of children into chunks using commas as the separator.
-        # Use groupby to pick on changes to whether or not the current node is a
-        # comma.
-        for node_is_comma, children in itertools.groupby(self.children, is_comma):
-            if not node_is_comma:
-                yield Node(list(children))
+        # Split the list of children into chunks using commas as the
+        # separator, slicing out the runs between comma positions directly.
+        children = self.children
+        run_start = 0
+        for index, child in enumerate(children):
+            if is_comma(child):
+                if index > run_start:
+                    yield Node(children[run_start:index])
+                run_start = index + 1
+
+        if run_start < len(children):
+            yield Node(children[run_start:])
 
         yield self.end
 
@@ -212,11 +324,12 @@ class ParensGroupNode(Node):
         return f"ParensGroupNode({self.start!r}, {self.children!r}, {self.end!r})"
 
     def __str__(self) -> str:
-        children = " ... " if self.children else ""
-        return f"<ParensGroupNode {self.start.token.string}{children}{self.end.token.string}>"
+        return self._str
 
 
 class OpenParensGroup:
+    __slots__ = ('start', 'children')
+
     def __init__(self, start: SingleTokenNode) -> None:
         self.start = start
         self.children: List[Node] = []
@@ -226,116 +339,232 @@ class OpenParensGroup:
 
 
 def parse_ast(tokens: Iterable[TokenInfo]) -> Node:
+    # Materialise the stream up front: iterating a concrete list is cheaper
+    # than resuming a generator per token, and keeps this loop amenable to
+    # ahead-of-time compilation should we ever ship a compiled build.
+    if not isinstance(tokens, list):
+        tokens = list(tokens)
+
+    # Fast path for input containing no brackets or commas at all: the result
+    # is a single run of tokens, so skip the stack machinery entirely. The
+    # pre-scan short-circuits on the first special token, so it costs little
+    # for input which does need the full parse.
+    if not any(tok.type == token.OP and tok.string in _OP_KIND for tok in tokens):
+        visible = tuple(tok for tok in tokens if tok.type not in WHITESPACE_TOKENS)
+        return Node([MultiTokenNode(visible)] if visible else [])
+
     stack: List[OpenParensGroup] = []
     spare_tokens: List[TokenInfo] = []
     spare_nodes: List[Node] = []
     root = Node(spare_nodes)
 
+    # Local bindings are faster to look up than globals in the loop below.
+    skip_tokens = WHITESPACE_TOKENS
+    op_type = token.OP
+    get_kind = _OP_KIND.get
+    comma_s = _COMMA_STR
+    lparen, lsqb, lbrace = _LPAREN, _LSQB, _LBRACE
+    rparen, rsqb, rbrace = _RPAREN, _RSQB, _RBRACE
+
     for tok in tokens:
-        if tok.type == token.ENDMARKER or tok.type in WHITESPACE_TOKENS:
+        if tok.type in skip_tokens:
             continue
 
-        kind = NodeKind.from_token(tok)
+        if tok.type == op_type:
+            # Identity checks against the interned strings cover the usual
+            # cases with pointer comparisons; a miss falls back to a real
+            # lookup so that an uncached string can't be misclassified.
+            s = tok.string
+            if s is comma_s:
+                kind: Optional[int] = _COMMA
+            elif s is lparen or s is lsqb or s is lbrace:
+                kind = _OPEN_PAREN
+            elif s is rparen or s is rsqb or s is rbrace:
+                kind = _CLOSE_PAREN
+            else:
+                kind = get_kind(s)
+        else:
+            kind = None
 
-        if kind == NodeKind.OTHER:
+        if kind is None:
             spare_tokens.append(tok)
             continue
 
         if spare_tokens:
-            spare_nodes.append(MultiTokenNode(spare_tokens))
-            spare_tokens = []
-
-        if kind == NodeKind.CLOSE_PAREN:
-            open_group = stack.pop()
-            spare_nodes = stack[-1].children if stack else root.children
-            node = open_group.complete(SingleTokenNode(tok))
-            spare_nodes.append(node)
-
-        elif kind == NodeKind.OPEN_PAREN:
-            open_group = OpenParensGroup(SingleTokenNode(tok))
+            # Freeze the run into a tuple for storage (smaller than a list,
+            # with no over-allocation slack) and reuse the scratch list.
+            spare_nodes.append(MultiTokenNode(tuple(spare_tokens)))
+            spare_tokens.clear()
+
+        # Ordered by how often each kind appears in typical source: commas
+        # outnumber brackets, and `_OP_KIND` can only produce these three
+        # kinds so the last branch needs no check of its own.
+        if kind == _COMMA:
+            spare_nodes.append(SingleTokenNode(tok, _NODE_KINDS[kind]))
+
+        elif kind == _OPEN_PAREN:
+            open_group = OpenParensGroup(SingleTokenNode(tok, _NODE_KINDS[kind]))
             stack.append(open_group)
             spare_nodes = open_group.children
 
-        elif kind == NodeKind.COMMA:
-            spare_nodes.append(SingleTokenNode(tok))
-
         else:
-            raise AssertionError(f"Unexpected NodeKind {kind!r}")
+            open_group = stack.pop()
+            spare_nodes = stack[-1].children if stack else root.children
+            node = open_group.complete(SingleTokenNode(tok, _NODE_KINDS[kind]))
+            spare_nodes.append(node)
 
     if spare_tokens:
-        root.children.append(MultiTokenNode(spare_tokens))
+        root.children.append(MultiTokenNode(tuple(spare_tokens)))
 
     return root
 
 
-def zip_with_prev(iterable: Iterable[T]) -> Iterable[Tuple[Union[T, U], T]]:
-    a, b = itertools.tee(iterable)
-    next(b)
-    return zip(a, b)
-
+def _check_parens_group(node: ParensGroupNode, errors: List[Error]) -> None:
+    if node.is_single_line() or not node.children:
+        return
 
-class ValidatingVisitor:
-    def __init__(self) -> None:
-        self.errors: List[Error] = []
-        self._in_multiline_parens_group = False
+    items = list(node.iter_comma_separated())
 
-    def visitChildren(self, node: Node) -> None:
-        for child in node.children:
-            child.visit(self)
+    # Convert to tuple of (starts on same line as previous, node)
+    states = [
+        (items[i - 1].end_line == items[i].start_line, items[i])
+        for i in range(1, len(items))
+    ]
 
-    def visitNode(self, node: Node) -> None:
-        self.visitChildren(node)
-
-    def visitSingleTokenNode(self, node: SingleTokenNode) -> None:
-        pass
+    same_line_starts = [x for same_line_start, x in states if same_line_start]
 
-    def visitMultiTokenNode(self, node: MultiTokenNode) -> None:
-        pass
-
-    def visitParensGroupNode(self, node: ParensGroupNode) -> None:
-        if node.is_single_line() or not node.children:
-            return
-
-        # Convert to tuple of (starts on same line as previous, node)
-        states = [
-            (prev.end_line == cur.start_line, cur)
-            for prev, cur in zip_with_prev(node.iter_comma_separated())
-        ]
-
-        same_line_starts = [x for same_line_start, x in states if same_line_start]
-
-        if same_line_starts and len(same_line_starts) < len(states):
-            self.errors.extend(
-                Error(
-                    *x.start_pos,
-                    f"Closing {x.token.string!r} not wrapped",
+    if same_line_starts and len(same_line_starts) < len(states):
+        for x in same_line_starts:
+            sp = x.start_pos
+            if type(x) is SingleTokenNode and x.kind is _CLOSE_PAREN_KIND:
+                errors.append(
+                    Error(sp[0], sp[1], f"Closing {x.token.string!r} not wrapped"),
                 )
-                if isinstance(x, SingleTokenNode) and x.kind == NodeKind.CLOSE_PAREN
-                else Error(
-                    *x.start_pos,
-                    "Argument should be wrapped when containing parens are wrapped",
+            else:
+                errors.append(
+                    Error(
+                        sp[0],
+                        sp[1],
+                        "Argument should be wrapped when containing parens are wrapped",
+                    ),
                 )
-                for x in same_line_starts
-            )
 
-        self.visitChildren(node)
+
+# Dispatch table from node type to its validation handler. Only parens groups
+# have checks of their own; other node types just have their children walked.
+_VALIDATION_HANDLERS: Dict[type, Callable[[ParensGroupNode, List[Error]], None]] = {
+    ParensGroupNode: _check_parens_group,
+}
 
 
 def validate(node: Node) -> List[Error]:
-    visitor = ValidatingVisitor()
-    node.visit(visitor)
-    return visitor.errors
+    errors: List[Error] = []
+
+    # Walk the tree with an explicit worklist rather than visitor dispatch:
+    # this keeps the traversal in a single Python frame and sidesteps the
+    # recursion limit for deeply nested input. Children are pushed in reverse
+    # so that errors are reported in document order.
+    get_handler = _VALIDATION_HANDLERS.get
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        handler = get_handler(type(current))
+        if handler is not None:
+            handler(cast(ParensGroupNode, current), errors)
+        stack.extend(reversed(current.children))
+
+    return errors
 
 
 def process(tokens: Iterable[TokenInfo]) -> List[Error]:
-    return validate(parse_ast(tokens))
+    """
+    Parse and validate in a single pass, without retaining the full tree.
+
+    This finds the same errors as ``validate(parse_ast(tokens))``, though it
+    returns them sorted by position rather than in document order: each parens
+    group is checked as soon as it closes (so inner groups report before the
+    groups containing them) and its children are then discarded, keeping live
+    memory proportional to bracket depth rather than file size.
+    """
+    errors: List[Error] = []
+    stack: List[OpenParensGroup] = []
+    top_level: List[Node] = []
+    spare_nodes = top_level
+
+    # The endpoints of the current run of uninteresting tokens; only the
+    # positions matter here, so the tokens in between aren't kept.
+    run_first: Optional[TokenInfo] = None
+
+    # Local bindings are faster to look up than globals in the loop below.
+    skip_tokens = WHITESPACE_TOKENS
+    op_type = token.OP
+    get_kind = _OP_KIND.get
+    comma_s = _COMMA_STR
+    lparen, lsqb, lbrace = _LPAREN, _LSQB, _LBRACE
+    rparen, rsqb, rbrace = _RPAREN, _RSQB, _RBRACE
+
+    for tok in tokens:
+        if tok.type in skip_tokens:
+            continue
+
+        if tok.type == op_type:
+            # Identity checks against the interned strings cover the usual
+            # cases with pointer comparisons; a miss falls back to a real
+            # lookup so that an uncached string can't be misclassified.
+            s = tok.string
+            if s is comma_s:
+                kind: Optional[int] = _COMMA
+            elif s is lparen or s is lsqb or s is lbrace:
+                kind = _OPEN_PAREN
+            elif s is rparen or s is rsqb or s is rbrace:
+                kind = _CLOSE_PAREN
+            else:
+                kind = get_kind(s)
+        else:
+            kind = None
+
+        if kind is None:
+            run_last = tok
+            if run_first is None:
+                run_first = tok
+            continue
+
+        if run_first is not None:
+            spare_nodes.append(_SpanNode(run_first, run_last))
+            run_first = None
+
+        if kind == _COMMA:
+            spare_nodes.append(SingleTokenNode(tok, _NODE_KINDS[kind]))
+
+        elif kind == _OPEN_PAREN:
+            open_group = OpenParensGroup(SingleTokenNode(tok, _NODE_KINDS[kind]))
+            stack.append(open_group)
+            spare_nodes = open_group.children
+
+        else:
+            open_group = stack.pop()
+            node = open_group.complete(SingleTokenNode(tok, _NODE_KINDS[kind]))
+            _check_parens_group(node, errors)
+            # The check above is the only consumer of the children; the
+            # group's own position info lives on its bracket nodes.
+            node.children = []
+            spare_nodes = stack[-1].children if stack else top_level
+            spare_nodes.append(node)
+
+        if not stack and top_level:
+            # Top-level nodes are never part of any group, so nothing will
+            # ever look at them again.
+            top_level.clear()
+
+    errors.sort()
+    return errors
 
 
 def parse_args(argv: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'file',
-        type=argparse.FileType(mode='rt'),
+        type=argparse.FileType(mode='rb'),
         help="The file to read from. Use '-' to read from STDIN.",
     )
     return parser.parse_args()
@@ -343,8 +572,19 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
 
 def run(args: argparse.Namespace) -> None:
     with args.file:
-        token_stream = tokenize.generate_tokens(args.file.readline)
-        errors = process(token_stream)
+        source = args.file.read()
+
+    if isinstance(source, str):
+        # `argparse.FileType` hands back the text-mode stdin for '-' on some
+        # Python versions, so we may get text despite asking for bytes.
+        token_stream = tokenize.generate_tokens(io.StringIO(source).readline)
+    else:
+        # Tokenize from an in-memory buffer rather than the file object
+        # directly: `BytesIO.readline` is a C-level call, avoiding a Python
+        # callback per source line.
+        token_stream = tokenize.tokenize(io.BytesIO(source).readline)
+
+    errors = process(token_stream)
 
     for error in errors:
         print(f"{args.file.name}:{error.line}:{error.col}: {error.message}")
@@ -0,0 +1,127 @@
+"""
+A visitor which renders a parsed tree as an indented text outline.
+
+This is primarily a debugging and testing aid -- the output is what the tests
+assert against and what failure messages display.
+"""
+
+import io
+from typing import Dict, List, Tuple
+
+from checker import (
+    Node,
+    MultiTokenNode,
+    ParensGroupNode,
+    SingleTokenNode,
+)
+
+
+# Indent strings keyed by depth, so that moving up and down the tree is an
+# integer adjustment rather than building new strings of spaces. Extended on
+# demand for unusually deep trees.
+_INDENTS = ["  " * i for i in range(32)]
+
+
+def _indent_for(depth: int) -> str:
+    while depth >= len(_INDENTS):
+        _INDENTS.append(_INDENTS[-1] + "  ")
+    return _INDENTS[depth]
+
+
+# Header lines only vary by node type, of which there are very few, so they
+# are memoised here rather than formatted per node.
+_HEADERS: Dict[type, str] = {}
+_EMPTY_HEADERS: Dict[type, str] = {}
+
+
+class StringifyVisitor:
+    __slots__ = ('_buf', '_prefix', '_depth', '_suffix')
+
+    @classmethod
+    def stringify(cls, node: Node) -> str:
+        # Reuse a single module-level instance, reset between calls, rather
+        # than allocating a fresh visitor per stringification. The tests are
+        # single-threaded, so the shared instance is safe.
+        _VISITOR.reset()
+        _VISITOR.traverse(node)
+        return _VISITOR.to_string()
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        # A StringIO accumulates the output in one C-managed buffer, avoiding
+        # the intermediate list of fragments (and its resizes) that a
+        # parts-plus-join approach builds up.
+        self._buf = io.StringIO()
+        self._prefix = ""
+        self._depth = 0
+        self._suffix = ""
+
+    def to_string(self) -> str:
+        return self._buf.getvalue()
+
+    def appendPart(self, string: str) -> None:
+        # A single formatted write per node; skip the formatting entirely
+        # when there's no decoration to add.
+        if self._depth or self._prefix or self._suffix:
+            indent = _indent_for(self._depth)
+            self._buf.write(f'{indent}{self._prefix}{string}{self._suffix}')
+        else:
+            self._buf.write(string)
+
+    def traverse(self, root: Node) -> None:
+        # Iterate with an explicit stack of (node, entering) pairs rather
+        # than recursing through the visitor protocol: the whole walk stays
+        # in one Python frame instead of making two calls per tree edge, and
+        # deep nesting can't hit the recursion limit. An exit entry restores
+        # the state saved when its node was entered.
+        stack: List[Tuple[Node, bool]] = [(root, True)]
+        saved_states: List[Tuple[str, int, str]] = []
+        push = stack.append
+
+        while stack:
+            node, entering = stack.pop()
+            if not entering:
+                self._prefix, self._depth, self._suffix = saved_states.pop()
+                continue
+
+            tp = type(node)
+            if tp is SingleTokenNode or tp is MultiTokenNode:
+                self.appendPart(str(node))
+                continue
+
+            # Branch nodes: ParensGroupNode or a plain Node grouping.
+            if tp is ParensGroupNode:
+                header = str(node)
+            elif node.children:
+                header = _HEADERS.get(tp) or _HEADERS.setdefault(
+                    tp,
+                    f'{node.NODE_TYPE_NAME}:',
+                )
+            else:
+                header = _EMPTY_HEADERS.get(tp) or _EMPTY_HEADERS.setdefault(
+                    tp,
+                    f'{node.NODE_TYPE_NAME}: []',
+                )
+
+            # The header line is emitted at the current indent and prefix --
+            # only the children shift -- and is fused into a single write,
+            # newline included, rather than going through appendPart and the
+            # suffix state.
+            self._buf.write(f'{_indent_for(self._depth)}{self._prefix}{header}\n')
+
+            saved_states.append((self._prefix, self._depth, self._suffix))
+            self._suffix = "\n"
+            # Indentation only increases once past the root, which is
+            # detected by there being a current prefix.
+            if self._prefix:
+                self._depth += 1
+            self._prefix = "- "
+
+            push((node, False))
+            for child in reversed(node.children):
+                push((child, True))
+
+
+_VISITOR = StringifyVisitor()
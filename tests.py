@@ -4,409 +4,387 @@ import io
 import textwrap
 import tokenize
 import unittest
-import contextlib
-from typing import List, Iterator
+import functools
+from typing import List, Tuple
 
 import checker
-from checker import (
-    Node,
-    Error,
-    MultiTokenNode,
-    ParensGroupNode,
-    SingleTokenNode,
-)
-
-
-class StringifyVisitor:
-    @classmethod
-    def stringify(cls, node: Node) -> str:
-        visitor = cls()
-        node.visit(visitor)
-        return visitor.to_string()
-
-    def __init__(self) -> None:
-        self.parts: List[str] = []
-        self._prefix = ""
-        self._indent = ""
-        self._suffix = ""
-
-    def to_string(self) -> str:
-        return "".join(self.parts)
-
-    @contextlib.contextmanager
-    def prefix(self, prefix: str) -> Iterator[None]:
-        original, self._prefix = self._prefix, prefix
-        try:
-            yield
-        finally:
-            self._prefix = original
-
-    @contextlib.contextmanager
-    def indent(self) -> Iterator[None]:
-        self._indent += "  "
-        try:
-            yield
-        finally:
-            self._indent = self._indent[:-2]
-
-    @contextlib.contextmanager
-    def indent_and_prefix(self, prefix: str) -> Iterator[None]:
-        indent = self.indent() if self._prefix else contextlib.nullcontext()
-        with indent, self.prefix(prefix):
-            yield
-
-    @contextlib.contextmanager
-    def suffix(self, suffix: str) -> Iterator[None]:
-        original, self._suffix = self._suffix, suffix
-        try:
-            yield
-        finally:
-            self._suffix = original
-
-    def visitChildren(self, node: Node) -> None:
-        for child in node.children:
-            child.visit(self)
-
-    def appendPart(self, string: str) -> None:
-        self.parts.append(self._indent)
-        self.parts.append(self._prefix)
-        self.parts.append(string)
-        self.parts.append(self._suffix)
-
-    def visitNode(self, node: Node) -> None:
-        with self.suffix("\n"):
-            name = type(node).__name__
-            if node.children:
-                self.appendPart(f'{name}:')
-
-                with self.indent_and_prefix("- "):
-                    self.visitChildren(node)
-            else:
-                self.appendPart(f'{name}: []')
-
-    def visitSingleTokenNode(self, node: SingleTokenNode) -> None:
-        self.appendPart(str(node))
-
-    def visitMultiTokenNode(self, node: MultiTokenNode) -> None:
-        self.appendPart(str(node))
-
-    def visitParensGroupNode(self, node: ParensGroupNode) -> None:
-        with self.suffix("\n"):
-            self.appendPart(str(node))
-            with self.indent_and_prefix("- "):
-                self.visitChildren(node)
-
-
-class TestAST(unittest.TestCase):
-    def assertAst(self, text: str, expected: str) -> None:
-        text = textwrap.dedent(text.lstrip('\n'))
-        expected = textwrap.dedent(expected.lstrip('\n'))
-
-        ast = checker.parse_ast(
-            tokenize.generate_tokens(
-                io.StringIO(text).readline,
-            ),
-        )
-
-        actual = StringifyVisitor.stringify(ast)
-
-        self.assertEqual(expected, actual)
-
-    def test_no_call(self) -> None:
-        self.assertAst(
-            'foo',
-            '''
-            Node:
-            - <MultiTokenNode 'foo'>
-            ''',
-        )
-
-    def test_call(self) -> None:
-        self.assertAst(
-            'foo()',
-            r'''
-            Node:
-            - <MultiTokenNode 'foo'>
-            - <ParensGroupNode ()>
-            ''',
-        )
-
-    def test_call_with_args(self) -> None:
-        self.assertAst(
-            'foo("abc", bar, 123)',
-            r'''
-            Node:
-            - <MultiTokenNode 'foo'>
-            - <ParensGroupNode ( ... )>
-              - <MultiTokenNode '"abc"'>
-              - <SingleTokenNode ','>
-              - <MultiTokenNode 'bar'>
-              - <SingleTokenNode ','>
-              - <MultiTokenNode '123'>
-            ''',
-        )
-
-    def test_nested_call(self) -> None:
-        self.assertAst(
-            'foo(bar())',
-            r'''
-            Node:
-            - <MultiTokenNode 'foo'>
-            - <ParensGroupNode ( ... )>
-              - <MultiTokenNode 'bar'>
-              - <ParensGroupNode ()>
-            ''',
+from checker import Node, Error
+from stringify import StringifyVisitor
+
+
+@functools.lru_cache(maxsize=512)
+def _dedent(text: str) -> str:
+    # textwrap.dedent does regex work per call, so cache the normalisation of
+    # the fixture literals, which never change between calls.
+    return textwrap.dedent(text.lstrip('\n'))
+
+
+@functools.lru_cache(maxsize=256)
+def _tokens(text: str) -> List[tokenize.TokenInfo]:
+    # Tokenization is the expensive half of parsing a fixture; cache the
+    # materialised token list per unique input so re-parses skip it.
+    return list(tokenize.generate_tokens(io.StringIO(text).readline))
+
+
+@functools.lru_cache(maxsize=256)
+def _parse(text: str) -> Node:
+    # Several tests use identical snippets, so share one AST per unique
+    # input. This is safe because nothing here mutates the parsed tree.
+    return checker.parse_ast(_tokens(text))
+
+
+class _LazyAstMessage:
+    # unittest only formats the failure message when an assertion actually
+    # fails, so deferring the stringify to __str__ means passing tests never
+    # pay for a tree traversal.
+    def __init__(self, ast: Node) -> None:
+        self._ast = ast
+
+    def __str__(self) -> str:
+        return f"Wrong errors.\nAST:\n{StringifyVisitor.stringify(self._ast)}"
+
+
+# Tables of (name, text, expected) cases, run via subTest so that per-case
+# fixtures and method dispatch are paid once per table rather than per case.
+
+AST_CASES: List[Tuple[str, str, str]] = [
+    (
+        'no_call',
+        'foo',
+        '''
+        Node:
+        - <MultiTokenNode 'foo'>
+        ''',
+    ),
+    (
+        'call',
+        'foo()',
+        r'''
+        Node:
+        - <MultiTokenNode 'foo'>
+        - <ParensGroupNode ()>
+        ''',
+    ),
+    (
+        'call_with_args',
+        'foo("abc", bar, 123)',
+        r'''
+        Node:
+        - <MultiTokenNode 'foo'>
+        - <ParensGroupNode ( ... )>
+          - <MultiTokenNode '"abc"'>
+          - <SingleTokenNode ','>
+          - <MultiTokenNode 'bar'>
+          - <SingleTokenNode ','>
+          - <MultiTokenNode '123'>
+        ''',
+    ),
+    (
+        'nested_call',
+        'foo(bar())',
+        r'''
+        Node:
+        - <MultiTokenNode 'foo'>
+        - <ParensGroupNode ( ... )>
+          - <MultiTokenNode 'bar'>
+          - <ParensGroupNode ()>
+        ''',
+    ),
+    (
+        'definition',
+        '''
+        def foo():
+            ...
+        ''',
+        r'''
+        Node:
+        - <MultiTokenNode 'def foo'>
+        - <ParensGroupNode ()>
+        - <MultiTokenNode ': ...'>
+        ''',
+    ),
+    (
+        'code_snippet',
+        '''
+        print("top")
+        def foo():
+            print("foo")
+        foo()
+        ''',
+        r'''
+        Node:
+        - <MultiTokenNode 'print'>
+        - <ParensGroupNode ( ... )>
+          - <MultiTokenNode '"top"'>
+        - <MultiTokenNode 'def foo'>
+        - <ParensGroupNode ()>
+        - <MultiTokenNode ': print'>
+        - <ParensGroupNode ( ... )>
+          - <MultiTokenNode '"foo"'>
+        - <MultiTokenNode 'foo'>
+        - <ParensGroupNode ()>
+        ''',
+    ),
+    (
+        'fully_wrapped_call',
+        '''
+        foo(
+            123,
+            [123],
+            [
+                123,
+            ],
         )
-
-    def test_definition(self) -> None:
-        self.assertAst(
-            '''
-            def foo():
-                ...
-            ''',
-            r'''
-            Node:
-            - <MultiTokenNode 'def foo'>
-            - <ParensGroupNode ()>
-            - <MultiTokenNode ': ...'>
-            ''',
+        ''',
+        r'''
+        Node:
+        - <MultiTokenNode 'foo'>
+        - <ParensGroupNode ( ... )>
+          - <MultiTokenNode '123'>
+          - <SingleTokenNode ','>
+          - <ParensGroupNode [ ... ]>
+            - <MultiTokenNode '123'>
+          - <SingleTokenNode ','>
+          - <ParensGroupNode [ ... ]>
+            - <MultiTokenNode '123'>
+            - <SingleTokenNode ','>
+          - <SingleTokenNode ','>
+        ''',
+    ),
+]
+
+# Normalise the fixture literals once, at import time, rather than on every
+# run of each case.
+AST_CASES = [
+    (name, _dedent(text), _dedent(expected))
+    for name, text, expected in AST_CASES
+]
+
+ERROR_CASES: List[Tuple[str, str, List[Error]]] = [
+    (
+        'no_call',
+        'foo',
+        [],
+    ),
+    (
+        'call',
+        'foo()',
+        [],
+    ),
+    (
+        'call_with_args',
+        'foo("abc", bar, 123)',
+        [],
+    ),
+    (
+        'wrapped_call_with_wrapped_args',
+        '''
+        foo(
+            "abc",
+            bar,
+            123,
         )
-
-    def test_code_snippet(self) -> None:
-        self.assertAst(
-            '''
-            print("top")
-            def foo():
-                print("foo")
-            foo()
-            ''',
-            r'''
-            Node:
-            - <MultiTokenNode 'print'>
-            - <ParensGroupNode ( ... )>
-              - <MultiTokenNode '"top"'>
-            - <MultiTokenNode 'def foo'>
-            - <ParensGroupNode ()>
-            - <MultiTokenNode ': print'>
-            - <ParensGroupNode ( ... )>
-              - <MultiTokenNode '"foo"'>
-            - <MultiTokenNode 'foo'>
-            - <ParensGroupNode ()>
-            ''',
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_with_single_line_args',
+        '''
+        foo(
+            "abc", bar, 123,
         )
-
-    def test_fully_wrapped_call(self) -> None:
-        self.assertAst(
-            '''
-            foo(
-                123,
-                [123],
-                [
-                    123,
-                ],
-            )
-            ''',
-            r'''
-            Node:
-            - <MultiTokenNode 'foo'>
-            - <ParensGroupNode ( ... )>
-              - <MultiTokenNode '123'>
-              - <SingleTokenNode ','>
-              - <ParensGroupNode [ ... ]>
-                - <MultiTokenNode '123'>
-              - <SingleTokenNode ','>
-              - <ParensGroupNode [ ... ]>
-                - <MultiTokenNode '123'>
-                - <SingleTokenNode ','>
-              - <SingleTokenNode ','>
-            ''',
+        ''',
+        [
+            Error(2, 11, "Argument should be wrapped when containing parens are wrapped"),
+            Error(2, 16, "Argument should be wrapped when containing parens are wrapped"),
+        ],
+    ),
+    (
+        'nested_call',
+        'foo(bar())',
+        [],
+    ),
+    (
+        'wrapped_nested_call',
+        '''
+        foo(
+            bar(),
         )
-
-
-class TestErrors(unittest.TestCase):
-    def assertErrors(self, text: str, expected: List[Error]) -> None:
-        text = textwrap.dedent(text.lstrip('\n'))
-
-        ast = checker.parse_ast(
-            tokenize.generate_tokens(
-                io.StringIO(text).readline,
-            ),
+        ''',
+        [],
+    ),
+    (
+        'wrapped_nested_call_hugging',
+        '''
+        foo(bar(
+            "abc",
+        ))
+        ''',
+        [],
+    ),
+    (
+        'call_single_argument_collection',
+        'foo([])',
+        [],
+    ),
+    (
+        'wrapped_call_single_argument_collection',
+        '''
+        foo(
+            ["abc"],
         )
-        errors = checker.validate(ast)
-
-        stringified = StringifyVisitor.stringify(ast)
-        self.assertEqual(expected, errors, f"Wrong errors.\nAST:\n{stringified}")
-
-    def assertNoErrors(self, text: str) -> None:
-        self.assertErrors(text, [])
-
-    def test_no_call(self) -> None:
-        self.assertNoErrors('foo')
-
-    def test_call(self) -> None:
-        self.assertNoErrors('foo()')
-
-    def test_call_with_args(self) -> None:
-        self.assertNoErrors('foo("abc", bar, 123)')
-
-    def test_wrapped_call_with_wrapped_args(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_single_argument_wrapped_collection',
+        '''
+        foo(
+            [
                 "abc",
-                bar,
-                123,
-            )
-            ''',
+            ],
         )
-
-    def test_wrapped_call_with_single_line_args(self) -> None:
-        self.assertErrors(
-            '''
-            foo(
-                "abc", bar, 123,
-            )
-            ''',
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_single_argument_collection_hugging',
+        '''
+        foo([
+            "abc",
+        ])
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_two_collections_hugging',
+        '''
+        foo([
+            "abc",
+        ], [
+            123,
+        ])
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_fully_wrapped_mixed',
+        '''
+        foo(
+            123,
+            ["abc"],
+            123,
             [
-                Error(2, 11, "Argument should be wrapped when containing parens are wrapped"),
-                Error(2, 16, "Argument should be wrapped when containing parens are wrapped"),
+                123,
             ],
         )
-
-    def test_nested_call(self) -> None:
-        self.assertNoErrors('foo(bar())')
-
-    def test_wrapped_nested_call(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(
-                bar(),
-            )
-            ''',
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_arguments_before_wrapped_collection',
+        '''
+        foo(123, [
+            "abc",
+        ])
+        ''',
+        [],
+    ),
+    (
+        'wrapped_call_argument_not_wrapped',
+        '''
+        foo("abc",
         )
+        ''',
+        [Error(1, 4, "Argument should be wrapped when containing parens are wrapped")],
+    ),
+    (
+        'wrapped_call_paren_insufficiently_wrapped',
+        '''
+        foo(
+            "abc")
+        ''',
+        [Error(2, 9, "Closing ')' not wrapped")],
+    ),
+    (
+        'wrapped_dict_literal',
+        '''
+        {
+            "longish key":
+                "very long value",
+        }
+        ''',
+        [],
+    ),
+    (
+        'wrapped_dict_literal_unwraped_closing_brace',
+        '''
+        {
+            "longish key":
+                "very long value"}
+        ''',
+        [Error(3, 25, "Closing '}' not wrapped")],
+    ),
+    (
+        'wrapped_dict_literal_unwraped_initial_key',
+        '''
+        {"longish key":
+            "very long value",
+        }
+        ''',
+        [Error(1, 1, "Argument should be wrapped when containing parens are wrapped")],
+    ),
+]
+
+
+ERROR_CASES = [
+    (name, _dedent(text), errors)
+    for name, text, errors in ERROR_CASES
+]
 
-    def test_wrapped_nested_call_hugging(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(bar(
-                "abc",
-            ))
-            ''',
-        )
 
-    def test_call_single_argument_collection(self) -> None:
-        self.assertNoErrors('foo([])')
+class TestAST(unittest.TestCase):
+    def assertAst(self, text: str, expected: str) -> None:
+        ast = _parse(text)
 
-    def test_wrapped_call_single_argument_collection(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(
-                ["abc"],
-            )
-            ''',
-        )
+        actual = StringifyVisitor.stringify(ast)
 
-    def test_wrapped_call_single_argument_wrapped_collection(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(
-                [
-                    "abc",
-                ],
-            )
-            ''',
-        )
+        self.assertEqual(expected, actual)
 
-    def test_wrapped_call_single_argument_collection_hugging(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo([
-                "abc",
-            ])
-            ''',
-        )
+    def test_cases(self) -> None:
+        for name, text, expected in AST_CASES:
+            with self.subTest(name):
+                self.assertAst(text, expected)
 
-    def test_wrapped_call_two_collections_hugging(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo([
-                "abc",
-            ], [
-                123,
-            ])
-            ''',
-        )
 
-    def test_wrapped_call_fully_wrapped_mixed(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(
-                123,
-                ["abc"],
-                123,
-                [
-                    123,
-                ],
-            )
-            ''',
-        )
+class TestErrors(unittest.TestCase):
+    def assertErrors(self, text: str, expected: List[Error]) -> None:
+        ast = _parse(text)
+        errors = checker.validate(ast)
 
-    def test_wrapped_call_arguments_before_wrapped_collection(self) -> None:
-        self.assertNoErrors(
-            '''
-            foo(123, [
-                "abc",
-            ])
-            ''',
-        )
+        self.assertEqual(expected, errors, _LazyAstMessage(ast))
 
-    def test_wrapped_call_argument_not_wrapped(self) -> None:
-        self.assertErrors(
-            '''
-            foo("abc",
-            )
-            ''',
-            [Error(1, 4, "Argument should be wrapped when containing parens are wrapped")],
-        )
+    def test_cases(self) -> None:
+        for name, text, expected in ERROR_CASES:
+            with self.subTest(name):
+                self.assertErrors(text, expected)
 
-    def test_wrapped_call_paren_insufficiently_wrapped(self) -> None:
-        self.assertErrors(
-            '''
-            foo(
-                "abc")
-            ''',
-            [Error(2, 9, "Closing ')' not wrapped")],
-        )
 
-    def test_wrapped_dict_literal(self) -> None:
-        self.assertNoErrors(
-            '''
-            {
-                "longish key":
-                    "very long value",
-            }
-            ''',
-        )
+class TestProcess(unittest.TestCase):
+    # `process` is the path the command line actually runs and has its own
+    # fused implementation of the parse loop, so drive it over the same cases
+    # as `validate` to keep the two in agreement. `process` reports errors
+    # sorted by position rather than in document order, hence the sort of the
+    # expectation.
+    def assertProcessErrors(self, text: str, expected: List[Error]) -> None:
+        errors = checker.process(_tokens(text))
 
-    def test_wrapped_dict_literal_unwraped_closing_brace(self) -> None:
-        self.assertErrors(
-            '''
-            {
-                "longish key":
-                    "very long value"}
-            ''',
-            [Error(3, 25, "Closing '}' not wrapped")],
-        )
+        self.assertEqual(sorted(expected), errors, _LazyAstMessage(_parse(text)))
 
-    def test_wrapped_dict_literal_unwraped_initial_key(self) -> None:
-        self.assertErrors(
-            '''
-            {"longish key":
-                "very long value",
-            }
-            ''',
-            [Error(1, 1, "Argument should be wrapped when containing parens are wrapped")],
-        )
+    def test_cases(self) -> None:
+        for name, text, expected in ERROR_CASES:
+            with self.subTest(name):
+                self.assertProcessErrors(text, expected)
 
 
 if __name__ == '__main__':